@@ -8,7 +8,11 @@ a further constraint on the network
 
 """
 
+import heapq
+import math
+from array import array
 from collections import deque
+from fractions import Fraction
 
 
 class Edge(frozenset):
@@ -53,10 +57,103 @@ class Edge(frozenset):
         Returns: string
 
         """
-        return_str = ''.join([("*" + str(x) + "* ") for x in self])
+        return_str = ''.join([("*" + str(x) + "* ")
+                              for x in sorted(self, key=order_key)])
         return ''.join(["|", return_str[:-1], "|"])
 
 
+class NetworkError(ValueError):
+    """Raised when the regions and lines supplied can't form a network.
+
+    The network is checked before any compound regions are generated, so
+    malformed input is reported straight away instead of part way through
+    a long enumeration.
+
+    """
+
+
+def order_key(item):
+    """Return a key that gives a fixed ordering of vertex and region ids.
+
+    Ids are compared by value, and ids of different types are kept apart by
+    the name of their type, so the order never depends on hash values.  Ids
+    that can't be compared, such as instances of a plain class, are ordered
+    by their repr instead.
+
+    Args:
+        item: vertex or region id
+
+    Returns: tuple
+
+    """
+    item_type = type(item)
+    try:
+        item < item
+    except TypeError:
+        return item_type.__module__, item_type.__qualname__, 1, repr(item)
+    return item_type.__module__, item_type.__qualname__, 0, item
+
+
+def set_string(items):
+    """Return a human readable string of a set with its items in order.
+
+    Args:
+        items: iterable
+
+    Returns: string
+
+    """
+    return "{" + ", ".join(repr(x) for x in sorted(items, key=order_key)) + "}"
+
+
+def canonical_rotation(vertices):
+    """Rotate a deque of vertices so that it starts at the smallest vertex.
+
+    The direction of the vertices is kept, so regions stay wound the same
+    way.  If the smallest vertex appears more than once, which happens where
+    a boundary is sliced to reach an internal cut out, the rotation that
+    gives the smallest sequence of vertices is used.
+
+    For Example:
+
+    [6, 3, 1, 2, 4, 5] becomes [1, 2, 4, 5, 6, 3]
+
+    Args:
+        vertices: deque of vertex ids
+
+    """
+    if not vertices:
+        return
+
+    keys = [order_key(x) for x in vertices]
+    smallest = min(keys)
+    starts = [i for i, key in enumerate(keys) if key == smallest]
+    start = min(starts, key=lambda i: keys[i:] + keys[:i])
+    vertices.rotate(-start)
+
+
+def rotate_to_edge(vertices, edge):
+    """Rotate a deque of vertices until a specific edge is at the end.
+
+    For Example:
+
+    If the deque is equal to [1, 2, 4, 5, 6, 3] and Edge(5, 4) is passed as
+    the edge the deque will become [6, 3, 1, 2, 4, 5]
+
+    Args:
+        vertices: deque of vertex ids
+        edge: Edge
+
+    """
+    # Rotate the vertex list until the connecting vertices are at the start
+    while Edge(vertices[0], vertices[1]) != edge:
+        vertices.rotate(-1)
+
+    # Rotate the vertex list 2 more times so that the connecting vertices
+    # are at the end
+    vertices.rotate(-2)
+
+
 def remove_folds(vertices):
     """Remove folds from a deque of vertices.
 
@@ -109,6 +206,8 @@ class Region:
         Initialize a Region with an id set, a value, and an list of vertices
         defining the region.  The list of vertices must be defined in a
         consistent clockwise or anti-clockwise manner between regions.
+        The vertex list is rotated to start at its smallest vertex so that
+        the same region is always described in the same way.
 
 
         Example:
@@ -135,6 +234,7 @@ class Region:
         self.__id = frozenset(region_id)
         self.__value = region_value
         self.__vertices = deque(region_vertices)
+        canonical_rotation(self.__vertices)
         self.__vertex_count = len(self.__vertices)
         self.__edges = []
         self.generate_edge_list()
@@ -157,7 +257,7 @@ class Region:
         vertex_string = ''.join([(" *" + str(x) + "*")
                                  for x in self.__vertices])
 
-        return "(" + str(set(self.__id)) + " =" + str(self.__value) + "=" +\
+        return "(" + set_string(self.__id) + " =" + str(self.__value) + "=" +\
             vertex_string + ")"
 
     def add_edge(self, e):
@@ -204,13 +304,7 @@ class Region:
             edge: Edge
 
         """
-        # Rotate the vertex list until the connecting vertices are at the start
-        while Edge(self.vertices[0], self.vertices[1]) != edge:
-            self.vertices.rotate(-1)
-
-        # Rotate the vertex list 2 more times so that the connecting vertices
-        # are at the end
-        self.vertices.rotate(-2)
+        rotate_to_edge(self.vertices, edge)
 
     def __add__(self, other):
         """The addition operation for Region objects.
@@ -228,8 +322,11 @@ class Region:
         valid result while (A + C) + B will return an empty region as A and C
         are not connected.
 
-        There is no guarantee that adding two regions with two separate shared
-        edges will yield the same result on different hardware.
+        When two regions have more than one shared edge, the first edge of
+        this Region's vertex list that is also an edge of the other Region is
+        used to join them.  As vertex lists always start at their smallest
+        vertex, adding the same two regions always gives the same result.
+        Neither Region is changed by the addition.
 
         For Example:
 
@@ -254,6 +351,7 @@ class Region:
         section
 
         Using the example above,  merging of vertex list is done as follows.
+        The lists are copied before they are rotated.
 
         1. Rotate the lists so the edge 8-4 is at the end
         2. Remove the end vertex from each list.
@@ -273,36 +371,27 @@ class Region:
         region_a = self
         region_b = other
 
-        region_a_edges = set(region_a.edges)
-        region_b_edges = set(region_b.edges)
+        if region_a.id.intersection(region_b.id):
+            return Region(set(), None, [])
 
-        shared_edges = list(region_a_edges.intersection(region_b_edges))
-        number_of_shared_edges = len(shared_edges)
+        # Get the first Edge of region_a that connects it to region_b
+        region_b_edges = set(region_b.edges)
+        shared_edge = next((edge for edge in region_a.edges
+                            if edge in region_b_edges), None)
 
         # If the regions don't share and edge, they
         # can't be added. Return a null region.
-        if number_of_shared_edges == 0:
+        if shared_edge is None:
             return Region(set(), None, [])
 
-        if region_a.id.intersection(region_b.id):
-            return Region(set(), None, [])
-
-        # Get an Edge that connects region_a to region_b
-        shared_edge = shared_edges[0]
-
-        # Rotate the vertex list until the vertices of the shared edge
-        # are at the end of each Region vertex list
-        region_a.rotate_vertices(shared_edge)
-        region_b.rotate_vertices(shared_edge)
-
-        # Create a new list from each Region's vertex list and remove
-        # the last element
-        vertex_list_a = deque()
-        vertex_list_a.extend(region_a.vertices)
+        # Copy each Region's vertex list, rotate it until the vertices of
+        # the shared edge are at the end, and remove the last element
+        vertex_list_a = deque(region_a.vertices)
+        rotate_to_edge(vertex_list_a, shared_edge)
         vertex_list_a.pop()
 
-        vertex_list_b = deque()
-        vertex_list_b.extend(region_b.vertices)
+        vertex_list_b = deque(region_b.vertices)
+        rotate_to_edge(vertex_list_b, shared_edge)
         vertex_list_b.pop()
 
         # Join the 2 new lists
@@ -410,7 +499,8 @@ class StraightLineSegment:
         Returns: string
 
         """
-        return_str = ''.join([("*" + str(x) + "* ") for x in self.__vertices])
+        return_str = ''.join([("*" + str(x) + "* ")
+                              for x in sorted(self.__vertices, key=order_key)])
         return ''.join(['-', return_str[:-1], '-'])
 
     @property
@@ -423,6 +513,203 @@ class StraightLineSegment:
         return self.__vertices
 
 
+class CompoundRegionStore:
+    """Compact column based storage for compound regions.
+
+    Large networks have many thousands of compound regions and a Region
+    object for each one uses a lot of memory.  Instead, each compound region
+    is stored as a row spread over a few flat arrays.
+
+    ids: integer bit masks, one bit for each base region id
+    vertices: all vertex indexes of all rows joined end to end
+    offsets: the start of the vertices of each row, plus the end of the
+        last row
+    values: the value of each row, kept in an integer array while every
+        value is an int that fits in 64 bits
+    triangles: 1 if the row is a triangular region, otherwise 0
+
+    Region objects are only created when a row is read.  Rows are added a
+    level at a time, where each level holds compound regions made up of
+    the same number of base regions.
+
+    """
+
+    def __init__(self, base_regions):
+        """Initialize an empty CompoundRegionStore.
+
+        Args:
+            base_regions: iterable of the base Regions that compound regions
+                will be made of
+
+        """
+        self.__base_ids = []
+        self.__bits = dict()
+        for region in base_regions:
+            for base_id in sorted(region.id, key=order_key):
+                self.__bits[base_id] = len(self.__base_ids)
+                self.__base_ids.append(base_id)
+
+        self.__vertex_labels = []
+        self.__vertex_indexes = dict()
+
+        self.__ids = []
+        self.__offsets = array('L', [0])
+        self.__vertices = array('L')
+        self.__values = array('q')
+        self.__triangles = bytearray()
+
+        # Compound regions made of a different number of base regions can't
+        # be equal, so duplicates only need to be found within a level
+        self.__level_start = 0
+        self.__level_rows = dict()
+
+    def __len__(self):
+        """Return the number of compound regions stored.
+
+        Returns: integer
+
+        """
+        return len(self.__ids)
+
+    def __iter__(self):
+        """Iterate over the stored compound regions as Region objects.
+
+        Returns: iterator of Regions
+
+        """
+        return (self.region(row) for row in range(0, len(self.__ids)))
+
+    def start_level(self):
+        """Start a new level of compound regions.
+
+        Returns: range of the rows in the previous level
+
+        """
+        previous_level = range(self.__level_start, len(self.__ids))
+        self.__level_start = len(self.__ids)
+        self.__level_rows = dict()
+        return previous_level
+
+    def mask(self, region):
+        """Return the bit mask id of a Region.
+
+        Args:
+            region: Region
+
+        Returns: integer
+
+        """
+        mask = 0
+        for base_id in region.id:
+            mask |= 1 << self.__bits[base_id]
+        return mask
+
+    def add(self, region):
+        """Add a Region to the current level if it isn't already there.
+
+        Args:
+            region: Region
+
+        Returns: integer row of the Region
+
+        """
+        mask = self.mask(region)
+        if mask in self.__level_rows:
+            return self.__level_rows[mask]
+
+        row = len(self.__ids)
+        self.__level_rows[mask] = row
+        self.__ids.append(mask)
+
+        for vertex in region.vertices:
+            if vertex not in self.__vertex_indexes:
+                self.__vertex_indexes[vertex] = len(self.__vertex_labels)
+                self.__vertex_labels.append(vertex)
+            self.__vertices.append(self.__vertex_indexes[vertex])
+        self.__offsets.append(len(self.__vertices))
+
+        # Values are kept as 64 bit integers until a value that doesn't fit
+        # is seen.  Then they move to a list so every value is returned
+        # exactly as it was given.
+        value = region.value
+        if isinstance(self.__values, array):
+            try:
+                if type(value) is not int:
+                    raise TypeError
+                self.__values.append(value)
+            except (TypeError, OverflowError):
+                self.__values = list(self.__values)
+                self.__values.append(value)
+        else:
+            self.__values.append(value)
+
+        self.__triangles.append(0)
+        return row
+
+    def region(self, row):
+        """Create a Region object from a stored row.
+
+        Args:
+            row: integer
+
+        Returns: Region
+
+        """
+        region_id = set()
+        mask = self.__ids[row]
+        while mask:
+            lowest_bit = mask & -mask
+            region_id.add(self.__base_ids[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+
+        start = self.__offsets[row]
+        end = self.__offsets[row + 1]
+        vertices = [self.__vertex_labels[i]
+                    for i in self.__vertices[start:end]]
+
+        return Region(region_id, self.__values[row], vertices)
+
+    def value(self, row):
+        """Return the value of a stored row.
+
+        Args:
+            row: integer
+
+        Returns: number
+
+        """
+        return self.__values[row]
+
+    def is_triangle(self, row):
+        """Return True if a stored row is marked as triangular.
+
+        Args:
+            row: integer
+
+        Returns: bool
+
+        """
+        return self.__triangles[row] == 1
+
+    def mark_triangle(self, row):
+        """Mark a stored row as triangular.
+
+        Args:
+            row: integer
+
+        """
+        self.__triangles[row] = 1
+
+    def triangle_rows(self):
+        """Return the rows marked as triangular.
+
+        Returns: list of integers
+
+        """
+        return [row for row in range(0, len(self.__ids))
+                if self.__triangles[row]]
+
+
 class StructuredNetwork:
     """A planar network with some geometric constraints.
 
@@ -435,9 +722,16 @@ class StructuredNetwork:
     Of these, the ones that are triangular are identified.  The value property
     of all of these are added together.
 
+    Alternatively, the "line_masks" solver finds the triangular regions
+    directly from every group of three straight lines without generating
+    the other compound regions.
+
     """
 
-    def __init__(self, network_regions, network_straight_lines):
+    SOLVERS = ("enumerate", "line_masks")
+
+    def __init__(self, network_regions, network_straight_lines,
+                 solver="enumerate"):
         """Initialize a StructuredNetwork with Regions & StraightLinesSegments.
 
         The network to be defined is supplied by dividing it into the smallest
@@ -448,14 +742,33 @@ class StructuredNetwork:
         vertices.
 
         Args:
-            network_regions: A set of Region objects
-            network_straight_lines: A set of StraightLineSegment objects
+            network_regions: A set (or other iterable) of Region objects
+            network_straight_lines: A set (or other iterable) of
+                StraightLineSegment objects
+            solver: "enumerate" to find triangles amongst all compound
+                regions, or "line_masks" to find them from groups of three
+                straight lines.  With "line_masks" only the triangular
+                regions are stored as compound regions.
 
         """
-        self.__regions = network_regions
+        if solver not in self.SOLVERS:
+            raise ValueError("solver must be one of " + str(self.SOLVERS))
+
+        # Regions are kept in order of their ids so the network is always
+        # processed in the same order.  They aren't put in a set first, as
+        # Regions with the same id are equal and duplicates would be dropped
+        # before validate_network could report them.
+        self.__regions = sorted(network_regions,
+                                key=lambda region: sorted(map(order_key,
+                                                              region.id)))
         self.__region_count = len(self.__regions)
 
-        self.__straight_lines = network_straight_lines
+        # StraightLineSegments are hashed by identity, so a set of them is
+        # iterated in a different order on every run.  They are sorted by
+        # their vertices instead.
+        self.__straight_lines = sorted(
+            network_straight_lines,
+            key=lambda line: sorted(map(order_key, line.vertices)))
         self.__straight_line_count = len(self.__straight_lines)
 
         # construct a dictionary of edges by iterating through each region
@@ -463,40 +776,427 @@ class StructuredNetwork:
         self.__edge_dict = dict()
         for region in self.__regions:
             for edge in region.edges:
-                if edge in self.__edge_dict:
-                    self.__edge_dict[edge].add(region)
-                else:
-                    self.__edge_dict[edge] = {region}
+                if edge not in self.__edge_dict:
+                    self.__edge_dict[edge] = [region]
+                elif region not in self.__edge_dict[edge]:
+                    self.__edge_dict[edge].append(region)
 
         self.__edge_count = len(self.__edge_dict)
 
-        # Create a list of sets. In increasing order the list will contain a set
-        # of compound regions with an increasing number of base regions.
-        # The first list entry will contain a set of the base regions.
-        # The second one will contain a set of all possible compound regions
-        # made up of two base regions. This pattern will continue until a
-        # compound region containing all base regions is created
+        # Reject malformed networks before doing any expensive work
+        self.validate_network()
+
+        self.__compound_regions = CompoundRegionStore(self.__regions)
+
+        if solver == "line_masks":
+            self.__compound_regions.start_level()
+            for region in self.find_line_triangles():
+                row = self.__compound_regions.add(region)
+                self.__compound_regions.mark_triangle(row)
+        else:
+            # Regions in separate components can never be joined, so each
+            # component is expanded on its own.
+            #
+            # Compound regions are built up a level at a time.  The first
+            # level of a component contains its base regions.  The second one
+            # will contain all possible compound regions made up of two base
+            # regions.  This pattern will continue until a compound region
+            # containing all base regions of the component is created
+
+            for component in self.connected_components():
+                self.__compound_regions.start_level()
+                for region in component:
+                    self.__compound_regions.add(region)
+
+                while self.expand_regions(self.__compound_regions):
+                    pass
+
+            # Check each compound region to see if it is triangular.
+            for row, region in enumerate(self.__compound_regions):
+                vertex_list = deque()
+                vertex_list.extend(region.vertices)
+                is_triangle = self.are_vertices_triangular(vertex_list)
+                if is_triangle:
+                    self.__compound_regions.mark_triangle(row)
 
-        compound_region_list = [self.__regions]
-        while len(compound_region_list[-1]) != 0:
-            self.expand_regions(compound_region_list)
-
-        self.__compound_regions = set.union(*compound_region_list)
         self.__compound_regions_count = len(self.__compound_regions)
 
-        # Check each compound region to see if it is triangular.
-        self.__triangular_regions = set()
-        for region in self.__compound_regions:
-            vertex_list = deque()
-            vertex_list.extend(region.vertices)
-            is_triangle = self.are_vertices_triangular(vertex_list)
-            if is_triangle:
-                self.__triangular_regions.add(region)
-
         # Add the values of all triangular Region objects
-        triangle_values = [region.value for region in self.__triangular_regions]
-        self.__sum_of_triangles = sum(triangle_values)
-        self.__triangular_region_count = len(self.__triangular_regions)
+        triangle_rows = self.__compound_regions.triangle_rows()
+        self.__sum_of_triangles = sum(self.__compound_regions.value(row)
+                                      for row in triangle_rows)
+        self.__triangular_region_count = len(triangle_rows)
+
+    def validate_network(self):
+        """Check that the base regions and straight lines form a valid network.
+
+        All checks are linear in the number of vertices and edges.
+
+        1. No region may repeat a vertex straight after itself, as that
+           gives an edge with a single vertex.
+        2. No region may have all of its vertices on one
+           StraightLineSegment, as it would have no area.
+        3. An edge can't border more than two regions.
+        4. Every region must have at least 3 vertices.
+        5. The ids of base regions must not overlap.
+        6. Regions must be wound consistently.  Two neighbouring regions
+           wound the same way traverse their shared edge in opposite
+           directions, so no directed edge can appear twice.
+        7. Every vertex of a StraightLineSegment must belong to a region.
+
+        Raises:
+            NetworkError: if any of the checks fail
+
+        """
+        lines_through = dict()
+        for i, straight_line in enumerate(self.__straight_lines):
+            for vertex in straight_line.vertices:
+                lines_through.setdefault(vertex, set()).add(i)
+
+        for region in self.__regions:
+            vertices = region.vertices
+            for i in range(0, region.vertex_count):
+                if vertices[i - 1] == vertices[i]:
+                    raise NetworkError("region " + str(region) +
+                                       " repeats vertex " + str(vertices[i]) +
+                                       " in consecutive positions")
+
+            shared_lines = set(lines_through.get(vertices[0], ())) \
+                if vertices else set()
+            for vertex in vertices:
+                shared_lines.intersection_update(
+                    lines_through.get(vertex, ()))
+            if shared_lines:
+                straight_line = self.__straight_lines[min(shared_lines)]
+                raise NetworkError("region " + str(region) +
+                                   " has all of its vertices on straight"
+                                   " line " + str(straight_line))
+
+        for edge, connected_regions in self.__edge_dict.items():
+            if len(connected_regions) > 2:
+                raise NetworkError(
+                    "edge " + str(edge) + " is shared by " +
+                    str(len(connected_regions)) + " regions")
+
+        base_ids = set()
+        directed_edges = dict()
+        region_vertices = set()
+
+        for region in self.__regions:
+            if region.vertex_count < 3:
+                raise NetworkError("region " + str(region) +
+                                   " has fewer than 3 vertices")
+
+            if base_ids.intersection(region.id):
+                raise NetworkError("region id " + set_string(region.id) +
+                                   " is used by more than one region")
+            base_ids.update(region.id)
+
+            region_vertices.update(region.vertices)
+
+            vertices = region.vertices
+            for i in range(0, region.vertex_count):
+                directed_edge = (vertices[i - 1], vertices[i])
+                if directed_edge in directed_edges:
+                    raise NetworkError(
+                        "regions " + str(directed_edges[directed_edge]) +
+                        " and " + str(region) + " both traverse edge " +
+                        str(Edge(*directed_edge)) + " in the same direction,"
+                        " vertices must be wound consistently")
+                directed_edges[directed_edge] = region
+
+        for straight_line in self.__straight_lines:
+            missing = set(straight_line.vertices).difference(region_vertices)
+            if missing:
+                raise NetworkError(
+                    "straight line " + str(straight_line) +
+                    " uses vertices that aren't in any region " +
+                    str(missing))
+
+    def connected_components(self):
+        """Split the base regions into groups connected by shared edges.
+
+        Returns: list of lists of Regions
+
+        """
+        components = []
+        visited = set()
+
+        for start in self.__regions:
+            if start in visited:
+                continue
+
+            # Flood out from the first region not yet assigned to a component
+            visited.add(start)
+            component = [start]
+            frontier = [start]
+            while frontier:
+                region = frontier.pop()
+                for edge in region.edges:
+                    for neighbour in self.__edge_dict[edge]:
+                        if neighbour not in visited:
+                            visited.add(neighbour)
+                            component.append(neighbour)
+                            frontier.append(neighbour)
+            components.append(component)
+
+        return components
+
+    def line_paths(self):
+        """Find the edges and the order of the vertices along each line.
+
+        Every StraightLineSegment is a line.  Edges that aren't part of any
+        StraightLineSegment are treated as lines with 2 vertices, as the side
+        of a triangle can be a single edge.  The edges of a line are the
+        edges joining two of its vertices.  Following them gives the order of
+        the vertices along the line.  A line that isn't completely drawn is
+        split into several pieces.
+
+        Returns: tuple of a list of sets of vertices, a list of sets of
+            Edges, and a list of dictionaries mapping each vertex of a line
+            to a tuple of (piece number, position in piece, piece)
+
+        """
+        line_vertices = [set(line.vertices) for line in self.__straight_lines]
+        line_edges = [set() for _ in line_vertices]
+
+        lines_through = dict()
+        for i, vertices in enumerate(line_vertices):
+            for vertex in vertices:
+                lines_through.setdefault(vertex, set()).add(i)
+
+        # Lines made of a single edge follow the StraightLineSegments, in
+        # order of their vertices
+        for edge in sorted(self.__edge_dict,
+                           key=lambda edge: sorted(map(order_key, edge))):
+            vertex_a, vertex_b = edge
+            shared_lines = lines_through.get(vertex_a, set()).intersection(
+                lines_through.get(vertex_b, set()))
+            for i in shared_lines:
+                line_edges[i].add(edge)
+            if not shared_lines:
+                line_vertices.append({vertex_a, vertex_b})
+                line_edges.append({edge})
+
+        line_positions = []
+        for edges in line_edges:
+            connected = dict()
+            for vertex_a, vertex_b in edges:
+                connected.setdefault(vertex_a, []).append(vertex_b)
+                connected.setdefault(vertex_b, []).append(vertex_a)
+
+            # Walk each piece of the line from one of its ends
+            positions = dict()
+            for start in sorted(connected, key=order_key):
+                if len(connected[start]) != 1 or start in positions:
+                    continue
+                piece = [start]
+                previous, vertex = None, start
+                while True:
+                    following = [x for x in connected[vertex]
+                                 if x != previous]
+                    if not following:
+                        break
+                    previous, vertex = vertex, following[0]
+                    piece.append(vertex)
+                piece_number = len(positions)
+                for position, vertex in enumerate(piece):
+                    positions[vertex] = (piece_number, position, piece)
+            line_positions.append(positions)
+
+        return line_vertices, line_edges, line_positions
+
+    def find_line_triangles(self):
+        """Find triangular regions from groups of three straight lines.
+
+        Every triangle is bounded by three lines.  Each base region is given
+        a bit, and for each line a mask is made of the regions on either side
+        of it.  A region is on one side of a line if it can be reached from
+        the regions bordering that side without crossing the line.  For a line
+        drawn from one side of the network to the other this splits the
+        regions in two.  The regions inside the triangle formed by three such
+        lines are then found by combining three masks with a bitwise and.
+        They only form a triangle if every edge on the outside of those
+        regions is on the triangle's sides, otherwise the network has a hole
+        or notch inside the triangle.
+
+        A line that stops inside the network doesn't split the regions in
+        two, as regions can be reached by going around its end, and a line
+        with regions on one side only has nothing to split.  Triangles with
+        a side on a line like this, or whose masks don't fill the triangle,
+        are found by flooding out from the side of the triangle, without
+        crossing any of its three lines.
+
+        Returns: list of Regions
+
+        """
+        regions = list(self.__regions)
+        bits = {region: bit for bit, region in enumerate(regions)}
+
+        # For each region, the edges it has and the region across each edge
+        neighbours = [[] for _ in regions]
+        for edge, connected_regions in self.__edge_dict.items():
+            if len(connected_regions) == 2:
+                region_a, region_b = connected_regions
+                neighbours[bits[region_a]].append((edge, bits[region_b]))
+                neighbours[bits[region_b]].append((edge, bits[region_a]))
+
+        # The region that traverses each edge in a given direction
+        directed_edges = dict()
+        for region in regions:
+            vertices = region.vertices
+            for i in range(0, region.vertex_count):
+                directed_edges[(vertices[i - 1], vertices[i])] = bits[region]
+
+        def flood(seeds, cut_edges):
+            mask = 0
+            frontier = []
+            for bit in seeds:
+                if not mask >> bit & 1:
+                    mask |= 1 << bit
+                    frontier.append(bit)
+            while frontier:
+                for edge, bit in neighbours[frontier.pop()]:
+                    if not mask >> bit & 1 and edge not in cut_edges:
+                        mask |= 1 << bit
+                        frontier.append(bit)
+            return mask
+
+        def path_seeds(path):
+            return [directed_edges[edge] for edge in zip(path, path[1:])
+                    if edge in directed_edges]
+
+        line_vertices, line_edges, line_positions = self.line_paths()
+        line_count = len(line_vertices)
+
+        # Masks of the regions on the forward and backward side of each line.
+        # The forward side borders the line where regions traverse it in the
+        # same direction as the vertex order along the line.
+        forward_masks = []
+        backward_masks = []
+        for i in range(0, line_count):
+            pieces = {id(piece): piece
+                      for _, _, piece in line_positions[i].values()}
+            forward_seeds = []
+            backward_seeds = []
+            for piece in pieces.values():
+                forward_seeds.extend(path_seeds(piece))
+                backward_seeds.extend(path_seeds(piece[::-1]))
+            forward_masks.append(flood(forward_seeds, line_edges[i]))
+            backward_masks.append(flood(backward_seeds, line_edges[i]))
+
+        def side_mask(i, forward):
+            return forward_masks[i] if forward else backward_masks[i]
+
+        # A line on the edge of the network has regions on one side only, and
+        # can't split the regions of a triangle from the rest
+        separating = [forward_masks[i] != 0 and backward_masks[i] != 0 and
+                      forward_masks[i] & backward_masks[i] == 0
+                      for i in range(0, line_count)]
+
+        # The vertex where each pair of lines meet
+        meeting_points = [dict() for _ in range(0, line_count)]
+        lines_through = dict()
+        for i, vertices in enumerate(line_vertices):
+            for vertex in vertices:
+                lines_through.setdefault(vertex, []).append(i)
+        for vertex, lines in lines_through.items():
+            for i in lines:
+                for j in lines:
+                    if i != j:
+                        meeting_points[i][j] = vertex
+
+        def side(i, start, end):
+            # The vertices along line i from start to end, if it's drawn
+            piece_a, position_a, piece = line_positions[i].get(
+                start, (None, None, None))
+            piece_b, position_b, _ = line_positions[i].get(
+                end, (None, None, None))
+            if piece_a is None or piece_a != piece_b:
+                return None, None
+            if position_a < position_b:
+                return piece[position_a:position_b + 1], True
+            return piece[position_b:position_a + 1][::-1], False
+
+        def is_enclosed(mask, boundary_edges):
+            # True if every edge on the outside of the mask is a boundary edge
+            for bit in range(0, mask.bit_length()):
+                if not mask >> bit & 1:
+                    continue
+                across = {edge: other for edge, other in neighbours[bit]}
+                for edge in regions[bit].edges:
+                    if edge in boundary_edges:
+                        continue
+                    if edge not in across or not mask >> across[edge] & 1:
+                        return False
+            return True
+
+        triangles = []
+        for i in range(0, line_count):
+            for j in sorted(meeting_points[i]):
+                if j <= i:
+                    continue
+                for k in sorted(meeting_points[i]):
+                    if k <= j or k not in meeting_points[j]:
+                        continue
+
+                    corner_a = meeting_points[i][j]
+                    corner_b = meeting_points[j][k]
+                    corner_c = meeting_points[i][k]
+                    if len({corner_a, corner_b, corner_c}) != 3:
+                        continue
+
+                    # Walk around the triangle a -> c -> b -> a
+                    side_i, forward_i = side(i, corner_a, corner_c)
+                    side_k, forward_k = side(k, corner_c, corner_b)
+                    side_j, forward_j = side(j, corner_b, corner_a)
+                    if side_i is None or side_k is None or side_j is None:
+                        continue
+                    boundary = side_i[:-1] + side_k[:-1] + side_j[:-1]
+                    boundary_edges = set(Edge(boundary[n - 1], boundary[n])
+                                         for n in range(0, len(boundary)))
+
+                    mask = 0
+                    if separating[i] and separating[j] and separating[k]:
+                        # One of these is the inside of the triangle, the
+                        # other is outside all three lines which is empty.
+                        # The regions found must also fill the triangle, as
+                        # there may be a hole or notch in the network.  If
+                        # they don't the triangle is looked for by flooding.
+                        mask = (side_mask(i, forward_i) &
+                                side_mask(k, forward_k) &
+                                side_mask(j, forward_j))
+                        if not mask:
+                            mask = (side_mask(i, not forward_i) &
+                                    side_mask(k, not forward_k) &
+                                    side_mask(j, not forward_j))
+                            boundary.reverse()
+                        if not is_enclosed(mask, boundary_edges):
+                            mask = 0
+                    if not mask:
+                        cut_edges = line_edges[i] | line_edges[j] | \
+                            line_edges[k]
+                        seeds = path_seeds(boundary + boundary[:1])
+                        mask = flood(seeds, cut_edges)
+                        if not mask or not is_enclosed(mask, boundary_edges):
+                            boundary.reverse()
+                            seeds = path_seeds(boundary + boundary[:1])
+                            mask = flood(seeds, cut_edges)
+                            if not is_enclosed(mask, boundary_edges):
+                                mask = 0
+
+                    if not mask:
+                        continue
+
+                    region_id = set()
+                    value = 0
+                    for bit in range(0, mask.bit_length()):
+                        if mask >> bit & 1:
+                            region_id.update(regions[bit].id)
+                            value += regions[bit].value
+                    triangles.append(Region(region_id, value, boundary))
+
+        return triangles
 
     def are_vertices_triangular(self, vertices):
         """Recursively check a deque of vertices to see if they form a triangle.
@@ -531,40 +1231,57 @@ class StructuredNetwork:
         # If a region can be described by 3 vertices it is a triangle.
         return len(vertices) == 3
 
-    def expand_regions(self, regions_by_order):
+    def expand_regions(self, compound_regions):
         """Expand compound Regions.
 
-        When passed a list of sets of Regions, each Region in the last set of
-        the list will be expanded.  This means that separately, and one at a
-        time, each edge of a compound Region will have any connected regions
-        added to it.  All of the new regions are added to a set which is
-        appended to the original list.  Adding a base region to a compound
-        region that already contains it will create a null region.
-        All of these are removed.
+        Each Region in the last level of a CompoundRegionStore will be
+        expanded.  This means that separately, and one at a time, each edge
+        of a compound Region will have any connected regions added to it.
+        All of the new regions are added to a new level of the store.  Adding
+        a base region to a compound region that already contains it will
+        create a null region.  These are discarded.
 
         Args:
-            regions_by_order: list of sets of regions
+            compound_regions: CompoundRegionStore
 
-        Returns:
+        Returns: integer number of Regions in the new level
 
         """
-        region_set = set()
+        last_level = compound_regions.start_level()
 
-        # iterate over each region in the last set
-        for region_a in regions_by_order[-1]:
+        # iterate over each region in the last level
+        for row in last_level:
+            region_a = compound_regions.region(row)
             # iterate over each edge in the region
             for edge in region_a.edges:
                 # iterate over each region that is connected to that edge
                 for region_b in self.__edge_dict[edge]:
                     # add the compound region to the new connected region
-                    # add this to the new set
-                    region_set.add(region_a + region_b)
+                    # and add this to the new level unless it's null
+                    new_region = region_a + region_b
+                    if new_region.id:
+                        compound_regions.add(new_region)
 
-        # remove null regions
-        region_set.remove(Region(set(), None, []))
+        return len(compound_regions) - last_level.stop
 
-        # add the set to the list
-        regions_by_order.append(region_set)
+    @property
+    def triangular_regions(self):
+        """Return the triangular Regions of the network.
+
+        Returns: list of Regions
+
+        """
+        return [self.__compound_regions.region(row)
+                for row in self.__compound_regions.triangle_rows()]
+
+    @property
+    def sum_of_triangles(self):
+        """Return the sum of the values of all triangular Regions.
+
+        Returns: number
+
+        """
+        return self.__sum_of_triangles
 
     def __str__(self):
         """A human readable string containing all information about the network.
@@ -586,15 +1303,16 @@ class StructuredNetwork:
         # a string describing all the edges and their connections in a network
         edge_string =\
             ''.join([(str(edge) + " -> " +
-                    ''.join(str(set(region.id))
+                    ''.join(set_string(region.id)
                             for region in connected_region) + '\n')
                      for edge, connected_region in self.__edge_dict.items()])
 
         compound_region_string = ''.join([(str(x) + "\n")
                                           for x in self.__compound_regions])
 
-        triangle_region_string = ''.join([(str(x) + "\n")
-                                          for x in self.__triangular_regions])
+        triangle_region_string = \
+            ''.join([(str(self.__compound_regions.region(row)) + "\n")
+                     for row in self.__compound_regions.triangle_rows()])
 
         # a string describing the network
         return_string = ''.join(["Base regions ({id} =value= *vertices*)\n",
@@ -618,6 +1336,486 @@ class StructuredNetwork:
 
         return return_string
 
+
+class SweepPoint:
+    """A point with exact rational coordinates, ordered left to right.
+
+    The point (X / D, Y / D) is stored as the integers X, Y and D along with
+    float approximations.  Points are ordered by x and then y.  Rounding to
+    a float never reverses the order of two numbers, so the floats are
+    compared first and the exact values are only needed when they're equal.
+
+    """
+
+    __slots__ = ('x', 'y', 'point')
+
+    def __init__(self, point):
+        """Create a SweepPoint.
+
+        Args:
+            point: tuple of integers (X, Y, D) with D positive
+
+        """
+        self.x = point[0] / point[2]
+        self.y = point[1] / point[2]
+        self.point = point
+
+    def __lt__(self, other):
+        """Return True if this point is before another one.
+
+        Args:
+            other: SweepPoint
+
+        Returns: bool
+
+        """
+        if self.x != other.x:
+            return self.x < other.x
+        x_a, y_a, d_a = self.point
+        x_b, y_b, d_b = other.point
+        if x_a * d_b != x_b * d_a:
+            return x_a * d_b < x_b * d_a
+        if self.y != other.y:
+            return self.y < other.y
+        return y_a * d_b < y_b * d_a
+
+
+def sweep_segments(segments):
+    """Find every point where line segments touch with a sweep line.
+
+    This is the Bentley-Ottmann algorithm.  A vertical line is swept from
+    left to right, stopping at segment ends and crossings (ties are broken
+    bottom to top).  The segments cut by the sweep line are kept ordered by
+    their height on it.  Two segments can only cross after they become
+    neighbours in that order, so only neighbours are tested against each
+    other and the work grows with the number of crossings rather than the
+    number of pairs of segments.
+
+    Coordinates must be integers and all arithmetic is exact.  Each point
+    is an integer tuple (X, Y, D) in lowest terms that represents the point
+    (X / D, Y / D), with D positive.
+
+    Args:
+        segments: list of pairs of integer (x, y) tuples, with the lowest
+            point of each pair first
+
+    Returns: list holding the set of points on each segment
+
+    """
+    def reduce_point(x, y, d):
+        divisor = math.gcd(math.gcd(x, y), d)
+        return x // divisor, y // divisor, d // divisor
+
+    # Segments through a point are ordered by slope, with vertical segments
+    # after all others.
+    slopes = []
+    for (x1, y1), (x2, y2) in segments:
+        if x1 == x2:
+            slopes.append((1, 0))
+        else:
+            slopes.append((0, Fraction(y2 - y1, x2 - x1)))
+
+    starting = dict()
+    queued = set()
+    for i, (start, end) in enumerate(segments):
+        start = (start[0], start[1], 1)
+        starting.setdefault(start, []).append(i)
+        queued.add(start)
+        queued.add((end[0], end[1], 1))
+    events = [SweepPoint(point) for point in queued]
+    heapq.heapify(events)
+
+    def compare_height(i, x, y, d):
+        # The sign of the height of segment i above the point, at the
+        # point's x coordinate.  Vertical segments in the sweep line always
+        # contain the current point.
+        (x1, y1), (x2, y2) = segments[i]
+        dx = x2 - x1
+        if dx == 0:
+            return 0
+        difference = y1 * dx * d + (y2 - y1) * (x - x1 * d) - y * dx
+        return (difference > 0) - (difference < 0)
+
+    def crossing(i, j):
+        # The single point where segments i and j cross, if there is one
+        (x1, y1), (x2, y2) = segments[i]
+        (x3, y3), (x4, y4) = segments[j]
+        r_x, r_y = x2 - x1, y2 - y1
+        s_x, s_y = x4 - x3, y4 - y3
+        q_x, q_y = x3 - x1, y3 - y1
+        denominator = r_x * s_y - r_y * s_x
+        if denominator == 0:
+            return None
+        t = q_x * s_y - q_y * s_x
+        u = q_x * r_y - q_y * r_x
+        if denominator < 0:
+            denominator, t, u = -denominator, -t, -u
+        if not (0 <= t <= denominator and 0 <= u <= denominator):
+            return None
+        return reduce_point(x1 * denominator + t * r_x,
+                            y1 * denominator + t * r_y, denominator)
+
+    def check_neighbours(i, j, point):
+        crossing_point = crossing(i, j)
+        if crossing_point is None or crossing_point in queued:
+            return
+        new_event = SweepPoint(crossing_point)
+        if point < new_event:
+            queued.add(crossing_point)
+            heapq.heappush(events, new_event)
+
+    segment_points = [set() for _ in segments]
+    status = []
+
+    while events:
+        current = heapq.heappop(events)
+        x, y, d = current.point
+
+        # Find the segments in the sweep line that pass through the point
+        low, high = 0, len(status)
+        while low < high:
+            middle = (low + high) // 2
+            if compare_height(status[middle], x, y, d) < 0:
+                low = middle + 1
+            else:
+                high = middle
+        high = low
+        while high < len(status) and \
+                compare_height(status[high], x, y, d) == 0:
+            high += 1
+
+        upper = starting.get(current.point, [])
+        involved = upper + status[low:high]
+        for i in involved:
+            segment_points[i].add(current.point)
+
+        # Segments that carry on past the point are put back in the order
+        # they have just after it
+        continuing = [i for i in status[low:high]
+                      if (segments[i][1][0] * d,
+                          segments[i][1][1] * d) != (x, y)]
+        continuing = upper + continuing
+        if len(continuing) > 1:
+            continuing.sort(key=lambda i: (slopes[i], i))
+        status[low:high] = continuing
+
+        if not continuing:
+            if 0 < low < len(status):
+                check_neighbours(status[low - 1], status[low], current)
+        else:
+            after = low + len(continuing)
+            if low > 0:
+                check_neighbours(status[low - 1], status[low], current)
+            if after < len(status):
+                check_neighbours(status[after - 1], status[after], current)
+
+    return segment_points
+
+
+def merge_close_points(points, tolerance):
+    """Group points that are within a tolerance of each other.
+
+    Lines that should meet at a single point can intersect a tiny distance
+    apart because of rounding.  Points closer than the tolerance, directly
+    or through a chain of other close points, are merged into one.  The
+    points are dropped into a grid of cells the size of the tolerance so
+    each point only needs to be compared with points in its own and the
+    neighbouring cells.
+
+    Args:
+        points: iterable of (x, y) tuples
+        tolerance: float
+
+    Returns: dictionary mapping each point to the smallest point it was
+        merged with
+
+    """
+    parent = dict()
+
+    def find(point):
+        while parent[point] != point:
+            parent[point] = parent[parent[point]]
+            point = parent[point]
+        return point
+
+    cells = dict()
+    for point in sorted(set(points)):
+        parent[point] = point
+        cell_x = math.floor(point[0] / tolerance)
+        cell_y = math.floor(point[1] / tolerance)
+        for x in (cell_x - 1, cell_x, cell_x + 1):
+            for y in (cell_y - 1, cell_y, cell_y + 1):
+                for other in cells.get((x, y), ()):
+                    if math.hypot(point[0] - other[0],
+                                  point[1] - other[1]) <= tolerance:
+                        root_a, root_b = find(point), find(other)
+                        # Keep the smallest point as the root
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+        cells.setdefault((cell_x, cell_y), []).append(point)
+
+    return {point: find(point) for point in parent}
+
+
+def point_in_polygon(point, polygon):
+    """Check if a point is inside a polygon.
+
+    A ray is cast from the point to the right and the number of polygon
+    edges it crosses is counted.  An odd number means the point is inside.
+
+    Args:
+        point: (x, y) tuple
+        polygon: list of (x, y) tuples
+
+    Returns: bool
+
+    """
+    x, y = point
+    inside = False
+    for k in range(0, len(polygon)):
+        (x1, y1), (x2, y2) = polygon[k - 1], polygon[k]
+        if (y1 > y) != (y2 > y):
+            if x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+    return inside
+
+
+def network_from_segments(segments, face_value=None, precision=6):
+    """Build Region and StraightLineSegment objects from line coordinates.
+
+    Instead of labelling every vertex by hand, a board can be described by
+    the line segments drawn on it.  Every point where segments meet becomes
+    a vertex and every bounded face of the drawing becomes a base Region.
+    All faces are wound anti-clockwise (in a y up coordinate system) so the
+    regions are consistent with each other.
+
+    Separate pieces of the drawing can sit side by side, but a piece drawn
+    inside a face without touching it would leave a hole in the face and
+    isn't supported.
+
+    Dangling segment ends that don't enclose a face are discarded.  Points
+    where segments meet that are closer together than 10**-precision are
+    merged into one vertex.  Segments that touch are treated as one
+    straight line when, after merging, the ends of each are within
+    10**-precision of the line through the other.  This lets coordinates
+    such as 0.1 and 0.3, which floats can't hold exactly, still describe
+    straight lines.
+
+    Intersections are found exactly with sweep_segments, using the input
+    coordinates as given.
+
+    Example:
+
+    A square split by one diagonal gives two triangular regions
+
+    regions, straight_lines, positions = network_from_segments(
+        [((0, 0), (2, 0)), ((2, 0), (2, 2)), ((2, 2), (0, 2)),
+         ((0, 2), (0, 0)), ((0, 0), (2, 2))])
+
+    Args:
+        segments: iterable of pairs of (x, y) tuples
+        face_value: function that takes the list of (x, y) tuples
+            bounding a face and returns the value of the face.  Faces have
+            a value of 0 if it isn't supplied.
+        precision: number of decimal places used when deciding if two
+            points are the same vertex, vertex positions are rounded to
+            this many places
+
+    Returns: tuple of a set of Regions, a list of StraightLineSegments,
+        and a dictionary mapping vertex ids to (x, y) tuples
+
+    Raises:
+        NetworkError: if a piece of the drawing is inside a face
+
+    """
+    tolerance = 10.0 ** -precision
+
+    def snap(point):
+        return (round(point[0], precision) + 0.0,
+                round(point[1], precision) + 0.0)
+
+    # Scale the coordinates to integers so the sweep can be done exactly,
+    # and store each segment with its lowest point first
+    coordinates = [(start[0].as_integer_ratio(), start[1].as_integer_ratio(),
+                    end[0].as_integer_ratio(), end[1].as_integer_ratio())
+                   for start, end in segments]
+    scale = 1
+    for coordinate in coordinates:
+        for _, denominator in coordinate:
+            scale = scale * denominator // math.gcd(scale, denominator)
+
+    segment_list = []
+    for x1, y1, x2, y2 in coordinates:
+        x1, y1, x2, y2 = (numerator * (scale // denominator)
+                          for numerator, denominator in (x1, y1, x2, y2))
+        start, end = sorted(((x1, y1), (x2, y2)))
+        if start != end:
+            segment_list.append((start, end))
+    segment_count = len(segment_list)
+
+    exact_points = sweep_segments(segment_list)
+
+    # Points along each segment in order, as floats
+    segment_points = []
+    for points in exact_points:
+        ordered_points = sorted(points, key=SweepPoint)
+        segment_points.append([(p[0] / (p[2] * scale), p[1] / (p[2] * scale))
+                               for p in ordered_points])
+
+    # Merge points that are meant to be the same vertex
+    merged_points = merge_close_points(
+        (point for points in segment_points for point in points), tolerance)
+    for point, root in merged_points.items():
+        merged_points[point] = snap(root)
+
+    # Join neighbouring points along each segment with an edge
+    neighbours = dict()
+    for points in segment_points:
+        ordered_points = [merged_points[point] for point in points]
+        for point_a, point_b in zip(ordered_points, ordered_points[1:]):
+            if point_a == point_b:
+                continue
+            neighbours.setdefault(point_a, set()).add(point_b)
+            neighbours.setdefault(point_b, set()).add(point_a)
+
+    # Repeatedly remove dangling edges as they can't be part of a face
+    dangling = [point for point, connected in neighbours.items()
+                if len(connected) < 2]
+    while dangling:
+        point = dangling.pop()
+        if point not in neighbours:
+            continue
+        for neighbour in neighbours.pop(point):
+            connected = neighbours[neighbour]
+            connected.discard(point)
+            if len(connected) < 2:
+                dangling.append(neighbour)
+
+    # Number the vertices from left to right
+    positions = sorted(neighbours)
+    vertex_ids = {point: i for i, point in enumerate(positions, 1)}
+
+    # Order the neighbours of each vertex anti-clockwise
+    rotation = dict()
+    for point, connected in neighbours.items():
+        rotation[point] = sorted(
+            connected, key=lambda other: math.atan2(other[1] - point[1],
+                                                    other[0] - point[0]))
+    rotation_index = {point: {other: k for k, other in enumerate(ordered)}
+                      for point, ordered in rotation.items()}
+
+    # Trace the face to the left of every directed edge.  At each vertex the
+    # walk turns onto the edge that is next clockwise from the one it
+    # arrived on.  Bounded faces are traced anti-clockwise and have a
+    # positive area, the unbounded outer face has a negative area.
+    faces = []
+    visited = set()
+    for point in positions:
+        for other in rotation[point]:
+            if (point, other) in visited:
+                continue
+
+            face = []
+            point_a, point_b = point, other
+            while (point_a, point_b) not in visited:
+                visited.add((point_a, point_b))
+                face.append(point_a)
+                ordered = rotation[point_b]
+                k = rotation_index[point_b][point_a]
+                point_a, point_b = point_b, ordered[k - 1]
+
+            area = sum(face[k - 1][0] * face[k][1] -
+                       face[k][0] * face[k - 1][1]
+                       for k in range(0, len(face)))
+            if area > 0:
+                faces.append(face)
+
+    # A separate piece of the drawing inside a face would leave a hole in
+    # that face, which a Region can't describe
+    component_of = dict()
+    for point in positions:
+        if point in component_of:
+            continue
+        component_of[point] = point
+        frontier = [point]
+        while frontier:
+            for other in neighbours[frontier.pop()]:
+                if other not in component_of:
+                    component_of[other] = point
+                    frontier.append(other)
+
+    components = set(component_of.values())
+    if len(components) > 1:
+        for face in faces:
+            for component in components:
+                if component != component_of[face[0]] and \
+                        point_in_polygon(component, face):
+                    raise NetworkError(
+                        "the part of the drawing at " + str(component) +
+                        " is inside a face but not connected to it, faces"
+                        " with holes aren't supported")
+
+    regions = set()
+    for face in faces:
+        value = 0 if face_value is None else face_value(face)
+        regions.add(Region({len(regions) + 1}, value,
+                           [vertex_ids[p] for p in face]))
+
+    # Segments are grouped into straight lines after their points have been
+    # merged, using the same tolerance, so segments that are only slightly
+    # out of line because of rounding still form one straight line.  Two
+    # segments that share a vertex are on the same line if the ends of each
+    # are within the tolerance of the line through the other.  At each
+    # vertex a segment is only compared with one segment of every line
+    # already found there.
+    line_parent = list(range(segment_count))
+
+    def find_line(i):
+        while line_parent[i] != i:
+            line_parent[i] = line_parent[line_parent[i]]
+            i = line_parent[i]
+        return i
+
+    segment_ends = []
+    segments_through = dict()
+    for i, points in enumerate(segment_points):
+        merged = [merged_points[p] for p in points]
+        segment_ends.append((merged[0], merged[-1]))
+        if merged[0] == merged[-1]:
+            continue
+        for point in set(merged):
+            if point in vertex_ids:
+                segments_through.setdefault(point, []).append(i)
+
+    def on_line(i, point):
+        (x1, y1), (x2, y2) = segment_ends[i]
+        offset = (x2 - x1) * (point[1] - y1) - (y2 - y1) * (point[0] - x1)
+        return abs(offset) <= tolerance * math.hypot(x2 - x1, y2 - y1)
+
+    for point in positions:
+        lines_here = []
+        for i in segments_through.get(point, ()):
+            for j in lines_here:
+                if all(on_line(j, end) for end in segment_ends[i]) and \
+                        all(on_line(i, end) for end in segment_ends[j]):
+                    line_parent[find_line(i)] = find_line(j)
+                    break
+            else:
+                lines_here.append(i)
+
+    # Gather the vertices of collinear segments into straight lines.  Only
+    # lines with 3 or more vertices add any information to the network.
+    line_vertices = dict()
+    for i in range(0, segment_count):
+        line_vertices.setdefault(find_line(i), set()).update(
+            vertex_ids[merged_points[p]] for p in segment_points[i]
+            if merged_points[p] in vertex_ids)
+    straight_lines = [StraightLineSegment(vertices)
+                      for _, vertices in sorted(line_vertices.items())
+                      if len(vertices) >= 3]
+
+    return regions, straight_lines, {vertex_ids[p]: p for p in positions}
+
+
 regions_1 = {Region({1},  8, [2,  3,  9]),
              Region({2},  3, [9,  3,  4]),
              Region({3},  5, [1,  2,  8]),
@@ -760,9 +1958,61 @@ straight_lines_6 = [StraightLineSegment({4,  2,  1}),
 
 triangle_game_6 = StructuredNetwork(regions_6, straight_lines_6)
 
+# A triangle with a hole in the middle
+regions_7 = {Region({1}, 1, [1, 2, 5, 4]),
+             Region({2}, 2, [2, 3, 6, 5]),
+             Region({3}, 3, [3, 1, 4, 6])}
+
+straight_lines_7 = []
+
+triangle_game_7 = StructuredNetwork(regions_7, straight_lines_7)
+
+# A triangle split into four with one corner missing, inside a border
+regions_8 = {Region({1}, 1, [1, 4, 6]),
+             Region({2}, 2, [6, 5, 3]),
+             Region({3}, 3, [4, 5, 6]),
+             Region({4}, 4, [1, 7, 2, 4]),
+             Region({5}, 5, [2, 8, 3, 5]),
+             Region({6}, 6, [3, 9, 1, 6])}
+
+straight_lines_8 = [StraightLineSegment({1, 4, 2}),
+                    StraightLineSegment({2, 5, 3}),
+                    StraightLineSegment({3, 6, 1})]
+
+triangle_game_8 = StructuredNetwork(regions_8, straight_lines_8)
+
+# A triangle whose corner is cut off by a short line, with regions on only
+# one side of that line
+regions_9, straight_lines_9, _ = network_from_segments(
+    [((0, 0), (6, 0)), ((6, 0), (0, 6)), ((0, 6), (0, 0)),
+     ((4, 0), (4, 6)), ((6, 4), (0, 4)), ((5, 4), (4, 2))])
+
+triangle_game_9 = StructuredNetwork(regions_9, straight_lines_9)
+
 print(triangle_game_1)
 print(triangle_game_2)
 print(triangle_game_3)
 print(triangle_game_4)
 print(triangle_game_5)
-print(triangle_game_6)
\ No newline at end of file
+print(triangle_game_6)
+print(triangle_game_7)
+print(triangle_game_8)
+print(triangle_game_9)
+
+# Check the line mask solver finds the same triangles as full enumeration
+demo_games = [(regions_1, straight_lines_1, triangle_game_1),
+              (regions_2, straight_lines_2, triangle_game_2),
+              (regions_3, straight_lines_3, triangle_game_3),
+              (regions_4, straight_lines_4, triangle_game_4),
+              (regions_5, straight_lines_5, triangle_game_5),
+              (regions_6, straight_lines_6, triangle_game_6),
+              (regions_7, straight_lines_7, triangle_game_7),
+              (regions_8, straight_lines_8, triangle_game_8),
+              (regions_9, straight_lines_9, triangle_game_9)]
+
+for regions, straight_lines, triangle_game in demo_games:
+    line_mask_game = StructuredNetwork(regions, straight_lines,
+                                       solver="line_masks")
+    assert sorted(map(str, line_mask_game.triangular_regions)) == \
+        sorted(map(str, triangle_game.triangular_regions))
+    assert line_mask_game.sum_of_triangles == triangle_game.sum_of_triangles